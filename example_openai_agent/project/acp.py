@@ -1,3 +1,4 @@
+import functools
 import os
 from typing import AsyncGenerator, List, Union
 
@@ -14,7 +15,7 @@ from agentex.lib.core.tracing.tracing_processor_manager import (
 )
 from agentex.lib.types.tracing import SGPTracingProcessorConfig
 
-from .tools import ADD_NUMBERS_TOOL
+from .tools import ALL_TOOLS
 from .prompts import AGENT_PROMPT
 
 from agents import RunResultStreaming, set_default_openai_client, set_default_openai_api
@@ -23,25 +24,50 @@ from openai.types.shared import Reasoning
 
 from project.openai_client import openai_client
 
-set_default_openai_client(openai_client)
-set_default_openai_api("chat_completions")
-
 logger = make_logger(__name__)
 
 # Only enable tracing if not in local development mode
 LOCAL_DEVELOPMENT = os.environ.get("LOCAL_DEVELOPMENT", "false").lower() == "true"
 
-if not LOCAL_DEVELOPMENT:
-    add_tracing_processor_config(
-        SGPTracingProcessorConfig(
-            sgp_api_key=os.environ.get("SGP_API_KEY", ""),
-            sgp_account_id=os.environ.get("SGP_ACCOUNT_ID", ""),
-            sgp_base_url=os.environ.get("SGP_BASE_URL", "https://sgp.ai.t-mobile.com/api/v5/"),
+
+@functools.cache
+def _bootstrap() -> None:
+    """Register the default OpenAI client and tracing processor once per process."""
+    set_default_openai_client(openai_client)
+    set_default_openai_api("chat_completions")
+
+    if not LOCAL_DEVELOPMENT:
+        add_tracing_processor_config(
+            SGPTracingProcessorConfig(
+                sgp_api_key=os.environ.get("SGP_API_KEY", ""),
+                sgp_account_id=os.environ.get("SGP_ACCOUNT_ID", ""),
+                sgp_base_url=os.environ.get("SGP_BASE_URL", "https://sgp.ai.t-mobile.com/api/v5/"),
+            )
         )
-    )
-    logger.info("Tracing enabled")
-else:
-    logger.info("Tracing disabled (LOCAL_DEVELOPMENT mode)")
+        logger.info("Tracing enabled")
+    else:
+        logger.info("Tracing disabled (LOCAL_DEVELOPMENT mode)")
+
+
+_bootstrap()
+
+# Agent configuration. Built once at import and shared by every turn.
+AGENT_NAME = "Assistant Agent"
+AGENT_INSTRUCTIONS = AGENT_PROMPT
+
+# Model configuration
+AGENT_MODEL = "openai/openai/gpt-5-mini"
+AGENT_MODEL_SETTINGS = SerializableModelSettings(
+    parallel_tool_calls=True,
+    reasoning=Reasoning(
+        effort="low",
+        summary="auto",
+    ),
+)
+TOOL_USE_BEHAVIOR = "run_llm_again"
+
+# Setup agent with tools (add your tools to ALL_TOOLS in tools.py)
+AGENT_TOOLS = ALL_TOOLS
 
 # Create an ACP server
 acp = FastACP.create(
@@ -64,15 +90,19 @@ async def handle_message_send(
 ) -> Union[TaskMessageContent, AsyncGenerator[TaskMessageUpdate, None], None]:
     """Message handler with state management and tracing support"""
     
-    # Validate incoming message
-    if not params.content:
-        return None
-
-    if params.content.type != "text":
-        raise ValueError(f"Expected text message, got {params.content.type}")
+    # Validate incoming message before touching any state
+    if (
+        not params.content
+        or params.content.type != "text"
+        or not params.content.content
+    ):
+        return TextContent(author="agent", content="Please provide a message.")
 
     if params.content.author != "user":
-        raise ValueError(f"Expected user message, got {params.content.author}")
+        return TextContent(
+            author="agent",
+            content=f"Expected user message, got {params.content.author}",
+        )
 
     # Retrieve the task state. Each event is handled as a new turn, so we need to get the state for the current turn.
     task_state = await adk.state.get_by_task_and_agent(task_id=params.task.id, agent_id=params.agent.id)
@@ -81,14 +111,16 @@ async def handle_message_send(
         state = StateModel(input_list=[], turn_number=0)
         task_state = await adk.state.create(task_id=params.task.id, agent_id=params.agent.id, state=state)
     else:
-        state = StateModel.model_validate(task_state.state)
+        # The stored state was validated when it was first written; skip re-validating
+        # the whole (growing) history on every turn
+        state = StateModel.model_construct(**task_state.state)
 
     # Increment turn number
     state.turn_number += 1
 
     # Decode and add the new user message to the message history
     user_prompt = params.content.content
-    logger.info(f"The user prompt: {user_prompt}")
+    logger.info("The user prompt: %s", user_prompt)
     state.input_list.append({"role": "user", "content": user_prompt})
     
     async with adk.tracing.span(
@@ -99,44 +131,23 @@ async def handle_message_send(
         trace_id = params.task.id
         input_list = state.input_list
 
-        # Configure agent settings
-        agent_name = "Assistant Agent"
-        agent_instructions = AGENT_PROMPT
-        
-        # Model configuration
-        model = "openai/openai/gpt-5-mini"
-        model_settings = SerializableModelSettings(
-            parallel_tool_calls=True,
-            reasoning=Reasoning(
-                effort="low",
-                summary="auto",
-            ),
-        )
-        tool_use_behavior = "run_llm_again"
-        
-        # Setup agent with tools (add your tools here)
-        tools = [
-            # Add your tools here
-            ADD_NUMBERS_TOOL
-        ]
-
         # Run the agent with streaming
         result: RunResultStreaming = await adk.providers.openai.run_agent_streamed_auto_send(
             task_id=params.task.id,
             trace_id=trace_id,
             parent_span_id=span.id if span else None,
             input_list=input_list,
-            agent_name=agent_name,
-            agent_instructions=agent_instructions,
-            model=model,
-            tool_use_behavior=tool_use_behavior,
-            model_settings=model_settings,
-            tools=tools,
+            agent_name=AGENT_NAME,
+            agent_instructions=AGENT_INSTRUCTIONS,
+            model=AGENT_MODEL,
+            tool_use_behavior=TOOL_USE_BEHAVIOR,
+            model_settings=AGENT_MODEL_SETTINGS,
+            tools=AGENT_TOOLS,
             mcp_server_params=[],
         )
         
-        logger.info(f"Agent: {result}")
-        logger.info(f"Agent streaming started for task {params.task.id}")
+        logger.debug("Agent: %s", result)
+        logger.info("Agent streaming started for task %s", params.task.id)
         
         # Update state with conversation history from result
         state.input_list = result.to_input_list()
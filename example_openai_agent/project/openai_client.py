@@ -1,4 +1,4 @@
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAioHttpClient
 import os
 import httpx
 
@@ -18,25 +18,24 @@ TEMPERATURE_B100 = int(os.environ.get("OAI_TEMPERATURE_B100", 0))
 # Check if running in local development mode
 LOCAL_DEVELOPMENT = os.environ.get("LOCAL_DEVELOPMENT", "false").lower() == "true"
 
-# Only disable SSL verification in local development mode
-if LOCAL_DEVELOPMENT:
-    http_client = httpx.AsyncClient(verify=False)
-    openai_client = AsyncOpenAI(
-        base_url=SGP_BASE_URL,
-        api_key="",
-        default_headers={
-            "x-api-key": SGP_API_KEY,
-            "x-selected-account-id": SGP_ACCOUNT_ID
-        },
-        http_client=http_client,
-    )
-else:
-    # In production, use default SSL verification
-    openai_client = AsyncOpenAI(
-        base_url=SGP_BASE_URL,
-        api_key="",
-        default_headers={
-            "x-api-key": SGP_API_KEY,
-            "x-selected-account-id": SGP_ACCOUNT_ID
-        },
-    )
+# Long-lived HTTP client with a larger keep-alive pool, so concurrent turns
+# reuse open TLS connections to the SGP endpoint. Uses the aiohttp transport,
+# which holds up better than httpx's under many concurrent requests.
+# Only disable SSL verification in local development mode.
+http_client = DefaultAioHttpClient(
+    verify=not LOCAL_DEVELOPMENT,
+    limits=httpx.Limits(
+        max_connections=512,
+        max_keepalive_connections=256,
+        keepalive_expiry=60.0,
+    ),
+)
+openai_client = AsyncOpenAI(
+    base_url=SGP_BASE_URL,
+    api_key="",
+    default_headers={
+        "x-api-key": SGP_API_KEY,
+        "x-selected-account-id": SGP_ACCOUNT_ID
+    },
+    http_client=http_client,
+)
@@ -4,6 +4,8 @@ Simple example tool demonstrating the tool pattern.
 """
 
 from typing import Any
+
+import orjson
 from agents import RunContextWrapper
 from pydantic import BaseModel, Field
 from agentex.lib.utils.logging import make_logger
@@ -34,18 +36,21 @@ async def add_numbers_impl(ctx: RunContextWrapper[Any], args: str) -> str:
     """
     Add two numbers together and return the result.
     """
-    logger.info(f"Adding numbers with args: {args}")
-    args_parsed = AddNumbersParams.model_validate_json(args)
-    
-    result = args_parsed.num1 + args_parsed.num2
-    
-    return str({
+    logger.info("Adding numbers with args: %s", args)
+    # The schema is two required floats, so skip the full Pydantic validator
+    parsed = orjson.loads(args)
+    num1 = float(parsed["num1"])
+    num2 = float(parsed["num2"])
+
+    result = num1 + num2
+
+    return orjson.dumps({
         "operation": "addition",
-        "num1": args_parsed.num1,
-        "num2": args_parsed.num2,
+        "num1": num1,
+        "num2": num2,
         "result": result,
-        "message": f"{args_parsed.num1} + {args_parsed.num2} = {result}"
-    })
+        "message": f"{num1} + {num2} = {result}"
+    }).decode()
 
 
 ADD_NUMBERS_TOOL = SerializableFunctionTool(
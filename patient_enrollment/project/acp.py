@@ -1,51 +1,88 @@
-import json
+import asyncio
+import inspect
 import os
-from typing import Any, AsyncGenerator, Callable
+from functools import cache
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Literal,
+    Sequence,
+    TypedDict,
+)
 
+import httpx
+import orjson
 from agentex.lib import adk
 from agentex.lib.sdk.fastacp.fastacp import FastACP
 from agentex.lib.types.acp import SendMessageParams
 from agentex.lib.utils.logging import make_logger
-from agentex.types.task_message_content import TaskMessageContent
-from agentex.types.task_message_update import TaskMessageUpdate
+from agentex.types.task_message_delta import TextDelta
+from agentex.types.task_message_update import (
+    StreamTaskMessageDelta,
+    StreamTaskMessageFull,
+    TaskMessageUpdate,
+)
 from agentex.types.text_content import TextContent
 from dotenv import find_dotenv, load_dotenv
 from pydantic import BaseModel
-from scale_gp import AsyncSGPClient
+from scale_gp import AsyncSGPClient, DefaultAioHttpClient
 from agentex.lib.types.tracing import SGPTracingProcessorConfig
 from agentex.lib.core.tracing.tracing_processor_manager import add_tracing_processor_config
 
 from .tools import (
+    COUNT_CANDIDATES_FOR_PROGRAM_TOOL_DEF,
     FIND_CANDIDATES_FOR_PROGRAM_TOOL_DEF,
     FIND_PERSON_BY_NAME_TOOL_DEF,
     FIND_PROGRAM_BY_NAME_TOOL_DEF,
     FIND_PROGRAMS_FOR_CANDIDATE_TOOL_DEF,
     LIST_ALL_PROGRAMS_TOOL_DEF,
+    count_candidates_for_program,
     find_candidates_for_program,
     find_person_by_name,
     find_program_by_name,
     find_programs_for_candidate,
     list_all_programs,
+    start_db_load,
 )
 
-if not (SGP_API_KEY := os.getenv("SGP_API_KEY")):
-    raise EnvironmentError("Missing SGP_API_KEY")
+# Load environment variables from .env file local or parent directories
+load_dotenv(find_dotenv())
 
-if not (SGP_ACCOUNT_ID := os.getenv("SGP_ACCOUNT_ID")):
-    raise EnvironmentError("Missing SGP_ACCOUNT_ID")
 
-if not (SGP_BASE_URL := os.getenv("SGP_BASE_URL")):
-    raise EnvironmentError("Missing SGP_BASE_URL")
+def _require_env() -> tuple[str, str, str]:
+    """Return the SGP API key, account id and base URL, failing fast if unset."""
+    api_key = os.getenv("SGP_API_KEY")
+    account_id = os.getenv("SGP_ACCOUNT_ID")
+    base_url = os.getenv("SGP_BASE_URL")
+    if not api_key or not account_id or not base_url:
+        raise EnvironmentError(
+            "SGP_BASE_URL, SGP_ACCOUNT_ID, and SGP_API_KEY must be set in environmental variables."
+        )
+    return api_key, account_id, base_url
+
+
+SGP_API_KEY, SGP_ACCOUNT_ID, SGP_BASE_URL = _require_env()
+
+MODEL = "gemini/gemini-2.5-flash"
 
-MODEL = "vertex_ai/gemini-2.5-flash"
 
-add_tracing_processor_config(
-    SGPTracingProcessorConfig(
-        sgp_api_key=SGP_API_KEY,
-        sgp_account_id=SGP_ACCOUNT_ID,
-        sgp_base_url=SGP_BASE_URL,
+@cache
+def _bootstrap() -> None:
+    """Register the SGP tracing processor once per process."""
+    add_tracing_processor_config(
+        SGPTracingProcessorConfig(
+            sgp_api_key=SGP_API_KEY,
+            sgp_account_id=SGP_ACCOUNT_ID,
+            sgp_base_url=SGP_BASE_URL,
+        )
     )
-)
+
+
+_bootstrap()
+
+# Load the clinical data in the background while the server starts up
+start_db_load()
 
 AGENT_NAME = "Clinical Trial Enrollment Agent"
 
@@ -58,173 +95,263 @@ You have access to the following tools:
 - find_program_by_name: Find a specific program by searching for its name
 - find_person_by_name: Find a person/candidate by searching for their name
 - find_candidates_for_program: Find all eligible candidates for a specific program (requires program_id like CP001)
+- count_candidates_for_program: Count the eligible candidates for a program without listing them (requires program_id like CP001)
 - find_programs_for_candidate: Find all eligible programs for a specific candidate (requires person_id like P001)
 
 Always be professional and helpful. When presenting candidates or programs, show their key information.
 If a user asks about a person by name, use find_person_by_name first to get their person_id, then you can use find_programs_for_candidate.
+If a user only asks how many candidates are eligible, use count_candidates_for_program instead of listing them.
 If a user asks about eligibility criteria, you can use the find_program_by_name tool to get program details first.
 """
 
 logger = make_logger(__name__)
 
-AGENT_TOOLS = [
+AGENT_TOOLS = (
     (list_all_programs, LIST_ALL_PROGRAMS_TOOL_DEF),
     (find_program_by_name, FIND_PROGRAM_BY_NAME_TOOL_DEF),
     (find_person_by_name, FIND_PERSON_BY_NAME_TOOL_DEF),
     (find_candidates_for_program, FIND_CANDIDATES_FOR_PROGRAM_TOOL_DEF),
+    (count_candidates_for_program, COUNT_CANDIDATES_FOR_PROGRAM_TOOL_DEF),
     (find_programs_for_candidate, FIND_PROGRAMS_FOR_CANDIDATE_TOOL_DEF),
-]
-
-MODEL = "gemini/gemini-2.5-flash"
+)
 
-# Load environment variables from .env file local or parent directories
-load_dotenv(find_dotenv())
+# Upper bound on tool-call rounds per turn. Every round resends the whole
+# conversation, so a model stuck calling tools would grow cost quadratically.
+MAX_TOOL_ROUNDS = 8
+TOOL_ROUNDS_EXHAUSTED_MESSAGE = (
+    "I wasn't able to finish looking that up. Could you give me more details, "
+    "such as the exact program or person you're asking about?"
+)
 
-if (
-    not os.getenv("SGP_BASE_URL")
-    or not os.getenv("SGP_ACCOUNT_ID")
-    or not os.getenv("SGP_API_KEY")
-):
-    raise EnvironmentError(
-        "SGP_BASE_URL, SGP_ACCOUNT_ID, and SGP_API_KEY must be set in environmental variables."
-    )
+# Static request prefix. Tool definitions are sorted by name so the prompt
+# prefix is byte-stable across turns, letting provider-side prompt caching hit.
+SYSTEM_MESSAGE = {"role": "system", "content": AGENT_INSTRUCTIONS}
+AGENT_TOOL_DEFS = sorted(
+    (tool_dict for _, tool_dict in AGENT_TOOLS), key=lambda d: d["name"]
+)
+AGENT_TOOL_MAP = {func.__name__: func for func, _ in AGENT_TOOLS}
+
+# Long-lived HTTP client with a larger keep-alive pool, so every completion in
+# the tool loop reuses an open TLS connection to the SGP endpoint. aiohttp
+# transport: httpx's own pool degrades under many concurrent requests.
+http_client = DefaultAioHttpClient(
+    limits=httpx.Limits(
+        max_connections=512,
+        max_keepalive_connections=256,
+        keepalive_expiry=60.0,
+    ),
+)
 
 # Initialize SGP client
 async_sgp_client = AsyncSGPClient(
-    base_url=os.getenv("SGP_BASE_URL"),
-    account_id=os.getenv("SGP_ACCOUNT_ID"),
-    api_key=os.getenv("SGP_API_KEY"),
+    base_url=SGP_BASE_URL,
+    account_id=SGP_ACCOUNT_ID,
+    api_key=SGP_API_KEY,
+    http_client=http_client,
 )
 
+# Cap on in-flight completion requests to the SGP gateway; bursts of turns
+# queue here instead of tripping the provider rate limit and retrying
+MAX_CONCURRENT_COMPLETIONS = int(os.getenv("MAX_CONCURRENT_COMPLETIONS", 16))
+completion_slots = asyncio.Semaphore(MAX_CONCURRENT_COMPLETIONS)
+
 # Create an ACP server
 acp = FastACP.create(acp_type="sync")
 
 
+class Message(TypedDict):
+    """A persisted chat message; the history only holds user/assistant text."""
+
+    role: Literal["user", "assistant"]
+    content: str
+
+
 class StateModel(BaseModel):
-    input_list: list[dict]
+    input_list: list[Message]
     turn_number: int
 
 
+def _merge_tool_call_delta(
+    tool_calls: list[dict], calls_by_index: dict[int, dict], delta: Any
+) -> None:
+    """
+    Accumulate a streamed tool call fragment into its full call.
+
+    Fragments are grouped by index, but a new id at an index already in use
+    starts a new call: some gateways stream every parallel call at index 0.
+    """
+    call = calls_by_index.get(delta.index)
+    if call is None or (delta.id and call["id"] and delta.id != call["id"]):
+        call = {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+        calls_by_index[delta.index] = call
+        tool_calls.append(call)
+    if delta.id:
+        call["id"] = delta.id
+    if delta.function:
+        if delta.function.name:
+            call["function"]["name"] += delta.function.name
+        if delta.function.arguments:
+            call["function"]["arguments"] += delta.function.arguments
+
+
+async def _execute_tool_call(tool_map: dict[str, Callable], tool_call: dict) -> dict:
+    """Execute a single tool call and return the tool message for it."""
+    tool_name = tool_call["function"]["name"]
+    args = orjson.loads(tool_call["function"]["arguments"] or "{}")
+
+    logger.info("Executing tool: %s with args: %s", tool_name, args)
+
+    func = tool_map[tool_name]
+    if inspect.iscoroutinefunction(func):
+        content = orjson.dumps(await func(**args)).decode()
+    else:
+        # Tools are blocking (DuckDB queries), so run them off the event loop.
+        # Their query results are memoized in tools.py (see clear_caches)
+        content = orjson.dumps(await asyncio.to_thread(func, **args)).decode()
+
+    logger.debug("Tool result: %s", content)
+
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call["id"],
+        "content": content,
+    }
+
+
+async def _stream_completion(deltas: asyncio.Queue, **request: Any) -> None:
+    """
+    Stream one completion into `deltas`, ending with a None sentinel.
+
+    The completion slot is held only while the provider streams; consumers
+    read from the queue at their own pace without keeping the slot busy.
+    """
+    try:
+        async with completion_slots:
+            stream = await async_sgp_client.beta.chat.completions.create(
+                **request, stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices:
+                    deltas.put_nowait(chunk.choices[0].delta)
+    finally:
+        deltas.put_nowait(None)
+
+
 async def run_gemini_with_tools(
-    messages: list[dict],
+    messages: list[Message],
     agent_instructions: str = AGENT_INSTRUCTIONS,
     model: str = MODEL,
-    tools: list[tuple[Callable, dict[str, Any]]] | None = None,
+    tools: Sequence[tuple[Callable, dict[str, Any]]] | None = None,
     temperature: float = 0.7,
     max_tokens: int = 1000,
-) -> str:
+) -> AsyncGenerator[str | None, None]:
     """
-    Run Gemini with clinical trial tools via SGP client.
+    Run Gemini with clinical trial tools via SGP client, streaming the answer.
 
     Args:
         messages: List of message dicts with role and content
-        agent_name: Name of the agent
         agent_instructions: System instructions for the agent
         model: Model name to use
         tools: List of (function, tool_dict) tuples, defaults to AGENT_TOOLS
         temperature: Model temperature
         max_tokens: Maximum tokens in response
 
-    Returns:
-        The assistant's response text
+    Yields:
+        Chunks of the assistant's response text as they arrive. None means the
+        text since the previous None led into tool calls and is not part of
+        the answer; discard it
     """
     if tools is None:
-        tools = AGENT_TOOLS
-
-    # Create tool map for executing functions
-    tool_map = {func.__name__: func for func, _ in tools}
-
-    # Extract just the tool dicts for the API
-    tool_defs = [tool_dict for _, tool_dict in tools]
-
-    # Prepend system message with instructions
-    conversation = [{"role": "system", "content": agent_instructions}] + messages
-
-    logger.info(f"Sending request to {model} with {len(tool_defs)} tools")
-
-    # First request - model decides if it needs to use tools
-    response = await async_sgp_client.beta.chat.completions.create(
-        model=model,
-        messages=conversation,
-        tools=tool_defs,
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
-
-    message = response.choices[0].message
-
-    # Loop until we get a response without tool calls
-    while hasattr(message, "tool_calls") and message.tool_calls:
-        logger.info(f"Model requested {len(message.tool_calls)} tool call(s)")
-
-        # Append assistant message with tool calls to conversation
-        conversation.append(
-            {
-                "role": "assistant",
-                "content": message.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        },
-                    }
-                    for tc in message.tool_calls
-                ],
-            }
+        tool_defs = AGENT_TOOL_DEFS
+        tool_map = AGENT_TOOL_MAP
+    else:
+        tool_defs = sorted(
+            (tool_dict for _, tool_dict in tools), key=lambda d: d["name"]
         )
+        tool_map = {func.__name__: func for func, _ in tools}
 
-        # Execute each tool call
-        for tool_call in message.tool_calls:
-            tool_name = tool_call.function.name
-            args = json.loads(tool_call.function.arguments)
-
-            logger.info(f"Executing tool: {tool_name} with args: {args}")
-
-            # Execute the actual function
-            result = tool_map[tool_name](**args)
-
-            logger.info(f"Tool result: {result}")
-
-            # Append tool result to conversation
-            conversation.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(result),
-                }
+    # Prepend the (stable) system message; only the history after it changes
+    if agent_instructions == AGENT_INSTRUCTIONS:
+        system_message = SYSTEM_MESSAGE
+    else:
+        system_message = {"role": "system", "content": agent_instructions}
+    conversation = [system_message, *messages]
+
+    logger.info("Sending request to %s with %d tools", model, len(tool_defs))
+
+    # Loop until we get a response without tool calls. The final round is only
+    # allowed to answer; a model still asking for tools there is stopped.
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        # Forward text as it arrives; tool calls come in fragments, in call order
+        content_parts: list[str] = []
+        tool_calls: list[dict] = []
+        calls_by_index: dict[int, dict] = {}
+        deltas: asyncio.Queue = asyncio.Queue()
+        completion = asyncio.create_task(
+            _stream_completion(
+                deltas,
+                model=model,
+                messages=conversation,
+                tools=tool_defs,
+                temperature=temperature,
+                max_tokens=max_tokens,
             )
+        )
+        try:
+            while (delta := await deltas.get()) is not None:
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield delta.content
+                for tool_call_delta in delta.tool_calls or []:
+                    _merge_tool_call_delta(tool_calls, calls_by_index, tool_call_delta)
+            # Surface a provider error raised mid-stream
+            await completion
+        finally:
+            completion.cancel()
+
+        if not tool_calls:
+            logger.info("Model returned final answer without tool calls")
+            return
+        if content_parts:
+            yield None
+        if tool_round == MAX_TOOL_ROUNDS:
+            break
+
+        logger.info("Model requested %d tool call(s)", len(tool_calls))
+
+        # Execute the tool calls concurrently; gather keeps the original order
+        # so each result stays paired with its tool_call_id
+        tool_messages = await asyncio.gather(
+            *(_execute_tool_call(tool_map, tc) for tc in tool_calls)
+        )
 
-        logger.info("Requesting next response with tool results...")
-
-        # Get next response with tool results
-        response = await async_sgp_client.beta.chat.completions.create(
-            model=model,
-            messages=conversation,
-            tools=tool_defs,
-            temperature=temperature,
-            max_tokens=max_tokens,
+        # Append the assistant tool-call message and its results in one go
+        conversation.extend(
+            [
+                {
+                    "role": "assistant",
+                    "content": "".join(content_parts),
+                    "tool_calls": tool_calls,
+                },
+                *tool_messages,
+            ]
         )
 
-        logger.info(f"Response: {response}")
-        message = response.choices[0].message
+        logger.info("Requesting next response with tool results...")
 
-    logger.info("Model returned final answer without tool calls")
-    return message.content
+    logger.warning("Model still requesting tools after %d rounds", MAX_TOOL_ROUNDS)
+    yield TOOL_ROUNDS_EXHAUSTED_MESSAGE
 
 
 @acp.on_message_send
 async def handle_message_send(
     params: SendMessageParams,
-) -> (
-    TaskMessageContent
-    | list[TaskMessageContent]
-    | AsyncGenerator[TaskMessageUpdate, None] 
-    | None
-):
-    """Handle incoming messages for clinical trial enrollment with AI agent."""
+) -> AsyncGenerator[TaskMessageUpdate, None]:
+    """Handle incoming messages for clinical trial enrollment with AI agent.
+
+    The answer is streamed back as text deltas followed by the full message;
+    the sync ACP server persists the streamed message for the task.
+    """
 
     # Extract message text
     if (
@@ -232,9 +359,14 @@ async def handle_message_send(
         or params.content.type != "text"
         or not params.content.content
     ):
-        return TextContent(author="agent", content="Please provide a message.")
+        yield StreamTaskMessageFull(
+            type="full",
+            index=0,
+            content=TextContent(author="agent", content="Please provide a message."),
+        )
+        return
     message_text = params.content.content
-    logger.info(f"Received message: {message_text}")
+    logger.info("Received message: %s", message_text)
 
     # Get or create task state
     task_state = await adk.state.get_by_task_and_agent(
@@ -247,7 +379,9 @@ async def handle_message_send(
             task_id=params.task.id, agent_id=params.agent.id, state=state
         )
     else:
-        state = StateModel.model_validate(task_state.state)
+        # The stored state was validated when it was first written; skip re-validating
+        # the whole (growing) history on every turn
+        state = StateModel.model_construct(**task_state.state)
 
     async with adk.tracing.span(
         trace_id=params.task.id,
@@ -259,37 +393,51 @@ async def handle_message_send(
         # Add user message to history
         state.input_list.append({"role": "user", "content": message_text})
 
+        response_parts: list[str] = []
         try:
-            response_text = await run_gemini_with_tools(
-                messages=state.input_list,
-            )
+            async for text in run_gemini_with_tools(messages=state.input_list):
+                if text is None:
+                    # That text led into tool calls; only the final round's
+                    # text is the answer
+                    response_parts.clear()
+                    continue
+                response_parts.append(text)
+                yield StreamTaskMessageDelta(
+                    type="delta",
+                    index=0,
+                    delta=TextDelta(type="text", text_delta=text),
+                )
         except Exception as e:
-            logger.exception(f"Error handling message: {str(e)}")
-            return TextContent(
-                author="agent", content=f"Sorry, I encountered an error: {str(e)}"
+            logger.exception("Error handling message: %s", e)
+            yield StreamTaskMessageFull(
+                type="full",
+                index=0,
+                content=TextContent(
+                    author="agent", content=f"Sorry, I encountered an error: {str(e)}"
+                ),
             )
+            return
         logger.info("Response generated successfully")
 
-        # Add assistant response to history
+        response_text = "".join(response_parts)
+
+        # Add assistant response to history and save it before sending the
+        # final message: the client may close the stream once it has it
         state.input_list.append({"role": "assistant", "content": response_text})
 
         span.output = state
 
         await adk.state.update(
-           state_id=task_state.id,
-           task_id=params.task.id,
-           parent_span_id=span.id if span else None,
-           agent_id=params.agent.id,
-           state=state,
-           trace_id=params.task.id,
-        )
-
-        await adk.messages.create(
+            state_id=task_state.id,
             task_id=params.task.id,
-            content=TextContent(
-                author="agent",
-                content=response_text,
-            ),
             parent_span_id=span.id if span else None,
+            agent_id=params.agent.id,
+            state=state,
+            trace_id=params.task.id,
+        )
+
+        yield StreamTaskMessageFull(
+            type="full",
+            index=0,
+            content=TextContent(author="agent", content=response_text),
         )
-    return None
\ No newline at end of file
@@ -0,0 +1,12 @@
+"""Build the DuckDB database file the tools load instead of the CSVs.
+
+Run from the agent directory:
+
+    python -m project.build_db
+"""
+
+from project.tools import DB_PATH, build_db_file
+
+if __name__ == "__main__":
+    build_db_file()
+    print(f"Wrote {DB_PATH}")
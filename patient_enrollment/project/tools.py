@@ -1,5 +1,8 @@
 """Tools for clinical trial enrollment agent."""
 
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import duckdb
@@ -9,24 +12,206 @@ from rapidfuzz.process import extractOne
 from functools import lru_cache
 
 
-@lru_cache(maxsize=1)  # memoize the DB connection
-def get_db_conn() -> duckdb.DuckDBPyConnection:
-    """Get a DuckDB connection with clinical trial data loaded."""
-    # Database connection
-    data_dir = Path(__file__).parent.parent / "data"
-    db = duckdb.connect(":memory:")
+DATA_DIR = Path(__file__).parent.parent / "data"
+PROGRAMS_CSV = DATA_DIR / "clinical_programs.csv"
+PERSONS_CSV = DATA_DIR / "persons.csv"
+# Prebuilt database (see build_db.py); used instead of the CSVs when present
+DB_PATH = DATA_DIR / "clinical.duckdb"
+
+# Queries here touch a few hundred rows at most, where intra-query
+# parallelism costs more than it saves; concurrency comes from tool calls
+# running in separate threads instead.
+DB_CONFIG = {"threads": int(os.getenv("DUCKDB_THREADS", "1"))}
+
+
+# Column types of the CSVs, so loading skips DuckDB's type sniffing
+PROGRAMS_SCHEMA = {
+    "program_id": "VARCHAR",
+    "program_name": "VARCHAR",
+    "phase": "VARCHAR",
+    "description": "VARCHAR",
+    "min_age": "BIGINT",
+    "max_age": "BIGINT",
+    "eligible_genders": "VARCHAR",
+    "required_conditions": "VARCHAR",
+    "excluded_conditions": "VARCHAR",
+    "min_bmi": "DOUBLE",
+    "max_bmi": "DOUBLE",
+    "smoking_allowed": "VARCHAR",
+    "min_hemoglobin_a1c": "DOUBLE",
+    "max_hemoglobin_a1c": "DOUBLE",
+    "min_egfr": "BIGINT",
+    "max_egfr": "BIGINT",
+    "required_medications": "VARCHAR",
+    "excluded_medications": "VARCHAR",
+    "max_participants": "BIGINT",
+}
+PERSONS_SCHEMA = {
+    "person_id": "VARCHAR",
+    "first_name": "VARCHAR",
+    "last_name": "VARCHAR",
+    "age": "BIGINT",
+    "gender": "VARCHAR",
+    "bmi": "DOUBLE",
+    "smoking_status": "VARCHAR",
+    "diabetes": "BOOLEAN",
+    "hypertension": "BOOLEAN",
+    "heart_disease": "BOOLEAN",
+    "cancer_history": "VARCHAR",
+    "asthma": "BOOLEAN",
+    "copd": "BOOLEAN",
+    "kidney_disease": "BOOLEAN",
+    "hemoglobin_a1c": "DOUBLE",
+    "ldl_cholesterol": "BIGINT",
+    "systolic_bp": "BIGINT",
+    "diastolic_bp": "BIGINT",
+    "egfr": "BIGINT",
+    "medications": "VARCHAR",
+}
+
+
+def _read_csv(path: Path, schema: dict[str, str]) -> str:
+    """SQL to read a CSV with a known header and column types."""
+    columns = ", ".join(f"'{name}': '{type_}'" for name, type_ in schema.items())
+    return (
+        f"read_csv('{path}', columns = {{{columns}}}, header = true, "
+        "delim = ',', quote = '\"', auto_detect = false)"
+    )
+
 
+def _load_tables(db: duckdb.DuckDBPyConnection) -> None:
+    """Create the programs and persons tables from the CSVs."""
     # Load CSVs into DuckDB tables
     db.execute(
-        f"CREATE TABLE programs AS SELECT * FROM read_csv_auto('{data_dir}/clinical_programs.csv')"
+        f"CREATE TABLE programs AS SELECT * FROM {_read_csv(PROGRAMS_CSV, PROGRAMS_SCHEMA)}"
+    )
+    db.execute(
+        f"CREATE TABLE persons AS SELECT * FROM {_read_csv(PERSONS_CSV, PERSONS_SCHEMA)}"
+    )
+
+    # Lowercased names for fuzzy matching, so lookups don't lowercase every
+    # candidate on every call
+    db.execute(
+        "ALTER TABLE persons ADD COLUMN lower_name VARCHAR;"
+        "UPDATE persons SET lower_name = lower(first_name || ' ' || last_name)"
     )
     db.execute(
-        f"CREATE TABLE persons AS SELECT * FROM read_csv_auto('{data_dir}/persons.csv')"
+        "ALTER TABLE programs ADD COLUMN lower_name VARCHAR;"
+        "UPDATE programs SET lower_name = lower(program_name)"
     )
 
+    # Store semicolon-separated values as lists so queries don't re-split them
+    for table, columns in (
+        ("persons", ["medications"]),
+        (
+            "programs",
+            [
+                "eligible_genders",
+                "required_conditions",
+                "excluded_conditions",
+                "smoking_allowed",
+                "required_medications",
+                "excluded_medications",
+            ],
+        ),
+    ):
+        for column in columns:
+            db.execute(
+                f"ALTER TABLE {table} ALTER {column} SET DATA TYPE VARCHAR[] "
+                f"USING string_split({column}, ';')"
+            )
+
+    # Each person's conditions as one list: the names of the boolean condition
+    # columns that are true, plus their cancer_history value
+    db.execute(
+        "ALTER TABLE persons ADD COLUMN conditions VARCHAR[];"
+        """UPDATE persons SET conditions = [cond FOR cond IN [
+            CASE WHEN diabetes THEN 'diabetes' END,
+            CASE WHEN hypertension THEN 'hypertension' END,
+            CASE WHEN heart_disease THEN 'heart_disease' END,
+            CASE WHEN asthma THEN 'asthma' END,
+            CASE WHEN copd THEN 'copd' END,
+            CASE WHEN kidney_disease THEN 'kidney_disease' END,
+            cancer_history
+        ] IF cond IS NOT NULL]"""
+    )
+
+    # Point lookups by id
+    db.execute("CREATE INDEX idx_programs_id ON programs(program_id)")
+    db.execute("CREATE INDEX idx_persons_id ON persons(person_id)")
+
+
+def build_db_file(path: Path = DB_PATH) -> None:
+    """Load the CSVs once and persist them as a DuckDB database file."""
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+    with duckdb.connect(str(tmp_path)) as db:
+        _load_tables(db)
+    # Swap in atomically so a concurrent reader never sees a partial file
+    os.replace(tmp_path, path)
+
+
+def _db_file_is_current() -> bool:
+    """Whether the prebuilt database exists and is newer than the CSVs."""
+    if not DB_PATH.exists():
+        return False
+    built = DB_PATH.stat().st_mtime
+    return all(built >= csv.stat().st_mtime for csv in (PROGRAMS_CSV, PERSONS_CSV))
+
+
+def _connect() -> duckdb.DuckDBPyConnection:
+    """Open a DuckDB connection with clinical trial data loaded."""
+    if _db_file_is_current():
+        # The data is static, so open read-only (no WAL or write locking)
+        return duckdb.connect(str(DB_PATH), read_only=True, config=DB_CONFIG)
+
+    # No prebuilt database: parse the CSVs into memory
+    db = duckdb.connect(":memory:", config=DB_CONFIG)
+    _load_tables(db)
     return db
 
 
+_db_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="duckdb-load")
+_db_load_lock = threading.Lock()
+_db_future: Future | None = None
+
+
+def start_db_load() -> Future:
+    """
+    Start loading the data in a background thread, once per process.
+
+    The server calls this at startup so the first tool call doesn't pay for
+    the load; it isn't done at import, so scripts like build_db that only
+    import this module don't parse the CSVs for nothing.
+    """
+    global _db_future
+    with _db_load_lock:
+        if _db_future is None:
+            _db_future = _db_loader.submit(_connect)
+            _db_loader.shutdown(wait=False)
+        return _db_future
+
+
+@lru_cache(maxsize=1)  # memoize the DB connection
+def get_db_conn() -> duckdb.DuckDBPyConnection:
+    """Get a DuckDB connection with clinical trial data loaded."""
+    return start_db_load().result()
+
+
+_thread_local = threading.local()
+
+
+def get_db_cursor() -> duckdb.DuckDBPyConnection:
+    """Get a thread-local cursor on the shared DuckDB connection.
+
+    A single DuckDB connection must not be used from several threads at once,
+    so tools (which may run concurrently in worker threads) go through this.
+    """
+    cursor = getattr(_thread_local, "cursor", None)
+    if cursor is None:
+        cursor = _thread_local.cursor = get_db_conn().cursor()
+    return cursor
+
 
 LIST_ALL_PROGRAMS_TOOL_DEF = {
     "name": "list_all_programs",
@@ -38,16 +223,22 @@ LIST_ALL_PROGRAMS_TOOL_DEF = {
     },
 }
 
-def list_all_programs() -> dict:
-    """List all available clinical programs."""
-    programs = (
-        get_db_conn()
+@lru_cache(maxsize=1)
+def _all_programs() -> tuple:
+    """All program rows, ordered by id."""
+    return tuple(
+        get_db_cursor()
         .execute(
             "SELECT program_id, program_name, phase, description FROM programs ORDER BY program_id"
         )
         .fetchall()
     )
 
+
+def list_all_programs() -> dict:
+    """List all available clinical programs."""
+    programs = _all_programs()
+
     return {
         "total_programs": len(programs),
         "programs": [
@@ -76,35 +267,50 @@ FIND_PERSON_BY_NAME_TOOL_DEF = {
     },
 }
 
+@lru_cache(maxsize=1)
+def _person_name_index() -> tuple[tuple, tuple[str, ...], dict[str, int]]:
+    """Person rows, their lowercased full names and an exact-name lookup."""
+    persons = tuple(
+        get_db_cursor()
+        .execute("SELECT person_id, first_name, last_name, age, gender, lower_name FROM persons")
+        .fetchall()
+    )
+    names = tuple(p[5] for p in persons)
+    # First position of each name, for exact matches
+    exact = {}
+    for i, n in enumerate(names):
+        exact.setdefault(n, i)
+    return persons, names, exact
+
+
 def find_person_by_name(name: str) -> dict:
     """Find person by name using fuzzy matching (RapidFuzz)."""
-    db = get_db_conn()
-    # Get all persons
-    persons = db.execute("SELECT person_id, first_name, last_name, age, gender FROM persons").fetchall()
-    # Create full names for matching
-    person_names = [f"{p[1]} {p[2]}" for p in persons]
-    # Use rapidfuzz to find best match
-    match = extractOne(
-        name,
-        person_names,
-        scorer=fuzz.WRatio,
-        score_cutoff=60,
-        processor=lambda x: x.lower()
-    )
+    persons, person_names, exact = _person_name_index()
+    query = name.lower()
+    # An exact name needs no fuzzy scoring
+    if (i := exact.get(query)) is not None:
+        match = (query, 100.0, i)
+    else:
+        # Use rapidfuzz to find best match; names are already lowercased
+        match = extractOne(
+            query,
+            person_names,
+            scorer=fuzz.WRatio,
+            score_cutoff=60,
+            processor=None,
+        )
     if not match:
         return {"error": f"No person found matching '{name}'"}
-    for p in persons:
-        if f"{p[1]} {p[2]}" == match[0]:
-            return {
-                "person_id": str(p[0]),
-                "first_name": str(p[1]),
-                "last_name": str(p[2]),
-                "full_name": match[0],
-                "age": int(p[3]),
-                "gender": str(p[4]),
-                "match_score": match[1],
-            }
-    return {"error": f"No person found matching '{name}'"}
+    p = persons[match[2]]
+    return {
+        "person_id": str(p[0]),
+        "first_name": str(p[1]),
+        "last_name": str(p[2]),
+        "full_name": f"{p[1]} {p[2]}",
+        "age": int(p[3]),
+        "gender": str(p[4]),
+        "match_score": match[1],
+    }
 
 FIND_PROGRAM_BY_NAME_TOOL_DEF = {
     "name": "find_program_by_name",
@@ -121,32 +327,48 @@ FIND_PROGRAM_BY_NAME_TOOL_DEF = {
     },
 }
 
+@lru_cache(maxsize=1)
+def _program_name_index() -> tuple[tuple, tuple[str, ...], dict[str, int]]:
+    """Program rows, their lowercased names and an exact-name lookup."""
+    programs = tuple(
+        get_db_cursor()
+        .execute("SELECT program_id, program_name, phase, description, lower_name FROM programs")
+        .fetchall()
+    )
+    names = tuple(p[4] for p in programs)
+    # First position of each name, for exact matches
+    exact = {}
+    for i, n in enumerate(names):
+        exact.setdefault(n, i)
+    return programs, names, exact
+
+
 def find_program_by_name(program_name: str) -> dict:
     """Find clinical program by name using fuzzy matching (RapidFuzz)."""
-    db = get_db_conn()
-    # Get all program names and ids
-    programs = db.execute("SELECT program_id, program_name, phase, description FROM programs").fetchall()
-    program_names = [p[1] for p in programs]
-    # Use rapidfuzz to find best match
-    match = extractOne(
-        program_name,
-        program_names,
-        scorer=fuzz.WRatio,
-        score_cutoff=60,
-        processor=lambda x: x.lower()
-    )
+    programs, program_names, exact = _program_name_index()
+    query = program_name.lower()
+    # An exact name needs no fuzzy scoring
+    if (i := exact.get(query)) is not None:
+        match = (query, 100.0, i)
+    else:
+        # Use rapidfuzz to find best match; names are already lowercased
+        match = extractOne(
+            query,
+            program_names,
+            scorer=fuzz.WRatio,
+            score_cutoff=60,
+            processor=None,
+        )
     if not match:
         return {"error": f"No program found matching '{program_name}'"}
-    for p in programs:
-        if p[1] == match[0]:
-            return {
-                "program_id": str(p[0]),
-                "program_name": str(p[1]),
-                "phase": str(p[2]),
-                "description": str(p[3]),
-                "match_score": match[1],
-            }
-    return {"error": f"No program found matching '{program_name}'"}
+    p = programs[match[2]]
+    return {
+        "program_id": str(p[0]),
+        "program_name": str(p[1]),
+        "phase": str(p[2]),
+        "description": str(p[3]),
+        "match_score": match[1],
+    }
 
 FIND_CANDIDATES_FOR_PROGRAM_TOOL_DEF = {
     "name": "find_candidates_for_program",
@@ -163,123 +385,108 @@ FIND_CANDIDATES_FOR_PROGRAM_TOOL_DEF = {
     },
 }
 
-def find_candidates_for_program(program_id: str) -> dict:
-    """Find eligible candidates for a clinical program using SQL."""
+# Whether person c is eligible for program p. Multi-valued columns are lists
+# (see _load_tables); conditions are matched against the person's combined
+# conditions list, which includes their cancer_history.
+ELIGIBILITY_PREDICATE = """
+    (p.min_age IS NULL OR c.age >= p.min_age)
+    AND (p.max_age IS NULL OR c.age <= p.max_age)
+    AND (p.eligible_genders IS NULL OR list_contains(p.eligible_genders, c.gender))
+    AND (p.min_bmi IS NULL OR c.bmi >= p.min_bmi)
+    AND (p.max_bmi IS NULL OR c.bmi <= p.max_bmi)
+    AND (p.smoking_allowed IS NULL OR list_contains(p.smoking_allowed, c.smoking_status))
+    AND (p.min_hemoglobin_a1c IS NULL OR c.hemoglobin_a1c >= p.min_hemoglobin_a1c)
+    AND (p.max_hemoglobin_a1c IS NULL OR c.hemoglobin_a1c <= p.max_hemoglobin_a1c)
+    AND (p.min_egfr IS NULL OR c.egfr >= p.min_egfr)
+    AND (p.max_egfr IS NULL OR c.egfr <= p.max_egfr)
+    AND (p.required_conditions IS NULL
+         OR list_has_all(c.conditions, p.required_conditions))
+    AND (p.excluded_conditions IS NULL
+         OR NOT list_has_any(c.conditions, p.excluded_conditions))
+    AND (p.required_medications IS NULL OR list_has_all(
+          COALESCE(c.medications, []), p.required_medications))
+    AND (p.excluded_medications IS NULL OR NOT list_has_any(
+          COALESCE(c.medications, []), p.excluded_medications))
+"""
+
+# One row per eligible person, each carrying the program name. The LEFT JOIN
+# keeps a single all-NULL person row when the program has no candidates, and
+# no rows at all means the program doesn't exist.
+CANDIDATES_FOR_PROGRAM_SQL = f"""
+    WITH p AS (SELECT * FROM programs WHERE program_id = ?)
+    SELECT p.program_name,
+           c.person_id, c.first_name || ' ' || c.last_name AS name, c.age, c.gender
+    FROM p
+    LEFT JOIN persons c ON {ELIGIBILITY_PREDICATE}
+    ORDER BY c.person_id
+"""
+
+PROGRAMS_FOR_CANDIDATE_SQL = f"""
+    SELECT p.program_id, p.program_name, p.phase, p.description
+    FROM programs p
+    JOIN persons c ON {ELIGIBILITY_PREDICATE}
+    WHERE c.person_id = ?
+    ORDER BY p.program_id
+"""
+
+
+@lru_cache(maxsize=256)
+def _program_candidates(program_id: str) -> tuple[str, tuple] | None:
+    """The program name and its eligible candidate rows, or None if not found."""
+    rows = get_db_cursor().execute(CANDIDATES_FOR_PROGRAM_SQL, [program_id]).fetchall()
+
+    if not rows:
+        return None
+
+    return rows[0][0], tuple(row[1:] for row in rows if row[1] is not None)
 
-    # Get program details
-    program = (
-        get_db_conn()
-        .execute("SELECT * FROM programs WHERE program_id = ?", [program_id])
-        .fetchone()
-    )  # type: ignore[assignment]
 
-    if not program:
+def find_candidates_for_program(program_id: str) -> dict:
+    """Find eligible candidates for a clinical program using SQL."""
+    found = _program_candidates(program_id)
+    if found is None:
         return {"error": f"Program {program_id} not found"}
-
-    # Build SQL query dynamically based on program criteria
-    conditions = []
-
-    # Age
-    if program[4]:  # min_age
-        conditions.append(f"age >= {program[4]}")
-    if program[5]:  # max_age
-        conditions.append(f"age <= {program[5]}")
-
-    # Gender
-    if program[6]:  # eligible_genders
-        genders = program[6].split(";")
-        gender_clause = " OR ".join([f"gender = '{g}'" for g in genders])
-        conditions.append(f"({gender_clause})")
-
-    # BMI
-    if program[9]:  # min_bmi
-        conditions.append(f"bmi >= {program[9]}")
-    if program[10]:  # max_bmi
-        conditions.append(f"bmi <= {program[10]}")
-
-    # Smoking
-    if program[11]:  # smoking_allowed
-        allowed = program[11].split(";")
-        smoking_clause = " OR ".join([f"smoking_status = '{s}'" for s in allowed])
-        conditions.append(f"({smoking_clause})")
-
-    # HbA1c
-    if program[12]:  # min_hemoglobin_a1c
-        conditions.append(f"hemoglobin_a1c >= {program[12]}")
-    if program[13]:  # max_hemoglobin_a1c
-        conditions.append(f"hemoglobin_a1c <= {program[13]}")
-
-    # eGFR
-    if program[14]:  # min_egfr
-        conditions.append(f"egfr >= {program[14]}")
-    if program[15]:  # max_egfr
-        conditions.append(f"egfr <= {program[15]}")
-
-    # Required conditions
-    if program[7]:  # required_conditions
-        for cond in program[7].split(";"):
-            if cond in [
-                "diabetes",
-                "hypertension",
-                "heart_disease",
-                "asthma",
-                "copd",
-                "kidney_disease",
-            ]:
-                conditions.append(f"{cond} = 'yes'")
-            else:
-                conditions.append(f"cancer_history = '{cond}'")
-
-    # Excluded conditions
-    if program[8]:  # excluded_conditions
-        for cond in program[8].split(";"):
-            if cond in [
-                "diabetes",
-                "hypertension",
-                "heart_disease",
-                "asthma",
-                "copd",
-                "kidney_disease",
-            ]:
-                conditions.append(f"{cond} = 'no'")
-            else:
-                conditions.append(f"cancer_history != '{cond}'")
-
-    # Required medications
-    if program[16]:  # required_medications
-        for med in program[16].split(";"):
-            conditions.append(f"CONTAINS(medications, '{med}')")
-
-    # Excluded medications
-    if program[17]:  # excluded_medications
-        for med in program[17].split(";"):
-            conditions.append(f"NOT CONTAINS(medications, '{med}')")
-
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-
-    query = f"""
-        SELECT person_id, first_name, last_name, age, gender
-        FROM persons
-        WHERE {where_clause}
-    """
-
-    candidates = get_db_conn().execute(query).fetchall()
+    program_name, candidates = found
 
     return {
         "program_id": program_id,
-        "program_name": str(program[1]),
+        "program_name": str(program_name),
         "total_eligible": len(candidates),
+        # Columns are already typed (VARCHAR/BIGINT), so no per-field casts
         "candidates": [
-            {
-                "person_id": str(c[0]),
-                "name": f"{c[1]} {c[2]}",
-                "age": int(c[3]),
-                "gender": str(c[4]),
-            }
-            for c in candidates
+            {"person_id": person_id, "name": name, "age": age, "gender": gender}
+            for person_id, name, age, gender in candidates
         ],
     }
 
+COUNT_CANDIDATES_FOR_PROGRAM_TOOL_DEF = {
+    "name": "count_candidates_for_program",
+    "description": "Count the eligible candidates for a clinical program, without listing them.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "program_id": {
+                "type": "string",
+                "description": "The ID of the clinical program to count candidates for (e.g., CP001).",
+            },
+        },
+        "required": ["program_id"],
+    },
+}
+
+def count_candidates_for_program(program_id: str) -> dict:
+    """Count eligible candidates for a clinical program."""
+    found = _program_candidates(program_id)
+    if found is None:
+        return {"error": f"Program {program_id} not found"}
+    program_name, candidates = found
+
+    return {
+        "program_id": program_id,
+        "program_name": str(program_name),
+        "total_eligible": len(candidates),
+    }
+
 FIND_PROGRAMS_FOR_CANDIDATE_TOOL_DEF = {
     "name": "find_programs_for_candidate",
     "description": "Find all clinical programs that a candidate is eligible for based on their medical profile.",
@@ -295,82 +502,37 @@ FIND_PROGRAMS_FOR_CANDIDATE_TOOL_DEF = {
     },
 }
 
-def find_programs_for_candidate(person_id: str) -> dict:
-    """Find all clinical programs that a candidate is eligible for using SQL."""
-    db = get_db_conn()
+@lru_cache(maxsize=256)
+def _candidate_programs(person_id: str) -> tuple[tuple, tuple] | None:
+    """The person row and their eligible program rows, or None if not found."""
+    db = get_db_cursor()
 
     # Get candidate details first
     candidate = db.execute("SELECT person_id, first_name, last_name, age, gender FROM persons WHERE person_id = ?", [person_id]).fetchone()
     if not candidate:
-        return {"error": f"Candidate {person_id} not found"}
+        return None
+
+    results = db.execute(PROGRAMS_FOR_CANDIDATE_SQL, [person_id]).fetchall()
+
+    return candidate, tuple(results)
 
-    # Single query with CROSS JOIN to check all programs
-    results = db.execute("""
-        SELECT p.program_id, p.program_name, p.phase, p.description,
-               p.required_conditions, p.excluded_conditions, p.required_medications, p.excluded_medications,
-               c.diabetes, c.hypertension, c.heart_disease, c.asthma, c.copd, c.kidney_disease,
-               c.cancer_history, c.medications
-        FROM programs p
-        CROSS JOIN persons c
-        WHERE c.person_id = ?
-          AND (p.min_age IS NULL OR c.age >= p.min_age)
-          AND (p.max_age IS NULL OR c.age <= p.max_age)
-          AND (p.eligible_genders IS NULL OR CONTAINS(p.eligible_genders, c.gender))
-          AND (p.min_bmi IS NULL OR c.bmi >= p.min_bmi)
-          AND (p.max_bmi IS NULL OR c.bmi <= p.max_bmi)
-          AND (p.smoking_allowed IS NULL OR CONTAINS(p.smoking_allowed, c.smoking_status))
-          AND (p.min_hemoglobin_a1c IS NULL OR c.hemoglobin_a1c >= p.min_hemoglobin_a1c)
-          AND (p.max_hemoglobin_a1c IS NULL OR c.hemoglobin_a1c <= p.max_hemoglobin_a1c)
-          AND (p.min_egfr IS NULL OR c.egfr >= p.min_egfr)
-          AND (p.max_egfr IS NULL OR c.egfr <= p.max_egfr)
-    """, [person_id]).fetchall()
-
-    eligible_programs = []
-
-    # Only need to check complex conditions/medications in Python
-    for row in results:
-        conditions_map = {"diabetes": row[8], "hypertension": row[9], "heart_disease": row[10],
-                         "asthma": row[11], "copd": row[12], "kidney_disease": row[13]}
-        cancer_history = row[14]
-        medications = row[15] or ""
-
-        eligible = True
-
-        # Check required/excluded conditions
-        if row[4]:  # required_conditions
-            for cond in row[4].split(";"):
-                if cond in conditions_map and conditions_map[cond] != "yes":
-                    eligible = False
-                    break
-                elif cond not in conditions_map and cancer_history != cond:
-                    eligible = False
-                    break
-
-        if eligible and row[5]:  # excluded_conditions
-            for cond in row[5].split(";"):
-                if cond in conditions_map and conditions_map[cond] == "yes":
-                    eligible = False
-                    break
-                elif cond not in conditions_map and cancer_history == cond:
-                    eligible = False
-                    break
-
-        # Check required/excluded medications
-        if eligible and row[6]:  # required_medications
-            if not all(med in medications for med in row[6].split(";")):
-                eligible = False
-
-        if eligible and row[7]:  # excluded_medications
-            if any(med in medications for med in row[7].split(";")):
-                eligible = False
-
-        if eligible:
-            eligible_programs.append({
-                "program_id": str(row[0]),
-                "program_name": str(row[1]),
-                "phase": str(row[2]),
-                "description": str(row[3]),
-            })
+
+def find_programs_for_candidate(person_id: str) -> dict:
+    """Find all clinical programs that a candidate is eligible for using SQL."""
+    found = _candidate_programs(person_id)
+    if found is None:
+        return {"error": f"Candidate {person_id} not found"}
+    candidate, results = found
+
+    eligible_programs = [
+        {
+            "program_id": str(row[0]),
+            "program_name": str(row[1]),
+            "phase": str(row[2]),
+            "description": str(row[3]),
+        }
+        for row in results
+    ]
 
     return {
         "person_id": str(candidate[0]),
@@ -380,3 +542,15 @@ def find_programs_for_candidate(person_id: str) -> dict:
         "total_eligible_programs": len(eligible_programs),
         "eligible_programs": eligible_programs,
     }
+
+
+def clear_caches() -> None:
+    """Drop memoized query results; call after the underlying data changes."""
+    for cached in (
+        _all_programs,
+        _person_name_index,
+        _program_name_index,
+        _program_candidates,
+        _candidate_programs,
+    ):
+        cached.cache_clear()
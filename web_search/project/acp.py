@@ -1,7 +1,15 @@
-import json
+import asyncio
+import functools
+import hashlib
 import os
-from typing import AsyncGenerator, List
-
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Iterator, List
+
+import orjson
+from ddgs import DDGS
 from dotenv import find_dotenv, load_dotenv
 
 # Load environment variables FIRST before any other imports that need them
@@ -11,14 +19,22 @@ from agentex.lib import adk
 from agentex.lib.sdk.fastacp.fastacp import FastACP
 from agentex.lib.types.acp import SendMessageParams
 from agentex.lib.utils.logging import make_logger
+from agentex.types.task_message_delta import TextDelta
+from agentex.types.task_message_update import (
+    StreamTaskMessageDelta,
+    StreamTaskMessageFull,
+    TaskMessageUpdate,
+)
 from agentex.types.task_message_content import TaskMessageContent
-from agentex.types.task_message_update import TaskMessageUpdate
 from agentex.types.text_content import TextContent
+from agentex.types.tool_request_content import ToolRequestContent
+from agentex.types.tool_response_content import ToolResponseContent
 from pydantic import BaseModel
 
 from agentex.lib.types.tracing import SGPTracingProcessorConfig
 from agentex.lib.core.tracing.tracing_processor_manager import add_tracing_processor_config
 
+from .clients._http import aclose_http_clients
 from .clients.sgp_client import async_sgp_client
 
 logger = make_logger(__name__)
@@ -34,30 +50,175 @@ if not (SGP_BASE_URL := os.getenv("SGP_BASE_URL")):
 
 MODEL = "vertex_ai/gemini-2.5-flash"
 
+# Custom web search tool, shared by every request
+WEB_SEARCH_TOOL_DEF = {
+    "type": "function",
+    "function": {
+        "name": "web_search",
+        "description": "Search the web for current, up-to-date information on any topic",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The search query to look up"
+                }
+            },
+            "required": ["query"]
+        }
+    }
+}
+TOOLS = [WEB_SEARCH_TOOL_DEF]
+
+# Most recent messages kept in state (and so sent to the model) per task.
+# Older turns are dropped, so per-turn request and state sizes stay bounded
+# instead of growing with the conversation. Keep it even: turns are pairs.
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", 40))
+
 # Configure tracing BEFORE creating the ACP server
-add_tracing_processor_config(
-    SGPTracingProcessorConfig(
-        sgp_api_key=SGP_API_KEY,
-        sgp_account_id=SGP_ACCOUNT_ID,
-        sgp_base_url=SGP_BASE_URL,
+@functools.cache
+def _bootstrap() -> None:
+    """Register the SGP tracing processor once per process."""
+    add_tracing_processor_config(
+        SGPTracingProcessorConfig(
+            sgp_api_key=SGP_API_KEY,
+            sgp_account_id=SGP_ACCOUNT_ID,
+            sgp_base_url=SGP_BASE_URL,
+        )
     )
-)
+
+
+_bootstrap()
 
 # Create an ACP server
 acp = FastACP.create(
     acp_type="sync",
 )
 
+_acp_lifespan = acp.router.lifespan_context
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    """Run the ACP server lifespan, then close the shared HTTP client."""
+    async with _acp_lifespan(app) as state:
+        yield state
+    await aclose_http_clients()
+
+
+acp.router.lifespan_context = _lifespan
+
 
 class StateModel(BaseModel):
     input_list: List[dict]
     turn_number: int
 
 
+# ============================================================================
+# Response Cache
+# ============================================================================
+
+# Exact-match cache of final answers, keyed by model, sampling settings and the
+# full message history. Only answers the model gave without searching are
+# cached (search results go stale), and entries expire after a short TTL.
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 300))
+RESPONSE_CACHE_MAX_ENTRIES = 256
+_response_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+
+def _response_cache_key(messages: List[dict], temperature: float, max_tokens: int) -> str:
+    """Hash the request inputs that determine a response."""
+    payload = orjson.dumps(
+        {"m": MODEL, "t": temperature, "mt": max_tokens, "msgs": messages},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _get_cached_response(key: str) -> str | None:
+    """Return a cached response that hasn't expired, if any."""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, response_text = entry
+    if time.monotonic() - stored_at > RESPONSE_CACHE_TTL_SECONDS:
+        del _response_cache[key]
+        return None
+    _response_cache.move_to_end(key)
+    return response_text
+
+
+def _cache_response(key: str, response_text: str) -> None:
+    """Store a response, evicting the least recently used entry when full."""
+    _response_cache[key] = (time.monotonic(), response_text)
+    _response_cache.move_to_end(key)
+    if len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+        _response_cache.popitem(last=False)
+
+
 # ============================================================================
 # Web Search Implementation with DuckDuckGo
 # ============================================================================
 
+_thread_local = threading.local()
+
+# Search results keyed by normalized query and result count. Entries expire
+# after SEARCH_CACHE_TTL_SECONDS so repeated questions skip the DuckDuckGo
+# round-trip without serving stale results indefinitely.
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 3600))
+SEARCH_CACHE_MAX_ENTRIES = 512
+
+# Time budget for all of a turn's searches together, counting only time spent
+# waiting on them. Searches still running when it runs out are dropped and the
+# model answers from the rest, so one slow DuckDuckGo request can't hold up
+# the whole reply.
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", 3.0))
+
+# Opt-in speculative search for the user's message while Gemini decides whether
+# to search (see the README for the trade-off). Cancelling an unused prefetch
+# doesn't stop its DuckDuckGo request (it runs in a worker thread), and short
+# messages such as greetings are never prefetched.
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "false").lower() == "true"
+SPECULATIVE_SEARCH_MIN_WORDS = int(os.getenv("SPECULATIVE_SEARCH_MIN_WORDS", 3))
+_search_cache: OrderedDict[tuple[str, int], tuple[float, list[dict]]] = OrderedDict()
+
+
+def _normalize_query(query: str) -> str:
+    """Lowercase a search query and collapse its whitespace."""
+    return " ".join(query.lower().split())
+
+
+def _get_cached_search(key: tuple[str, int]) -> list[dict] | None:
+    """Return cached search results that haven't expired, if any."""
+    entry = _search_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, results = entry
+    if time.monotonic() - stored_at > SEARCH_CACHE_TTL_SECONDS:
+        del _search_cache[key]
+        return None
+    _search_cache.move_to_end(key)
+    return results
+
+
+def _cache_search(key: tuple[str, int], results: list[dict]) -> None:
+    """Store search results, evicting the least recently used entry when full."""
+    _search_cache[key] = (time.monotonic(), results)
+    _search_cache.move_to_end(key)
+    if len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+        _search_cache.popitem(last=False)
+
+
+def _ddgs_text(query: str, max_results: int) -> list[dict]:
+    """Run a DuckDuckGo text search with this thread's DDGS client."""
+    # One client per worker thread: reuses its connections without sharing
+    # a client between threads
+    ddgs = getattr(_thread_local, "ddgs", None)
+    if ddgs is None:
+        ddgs = _thread_local.ddgs = DDGS()
+    return list(ddgs.text(query, max_results=max_results))
+
+
 async def search_web_duckduckgo(query: str, max_results: int = 5):
     """
     Perform web search using DuckDuckGo (free, no API key needed)
@@ -69,14 +230,17 @@ async def search_web_duckduckgo(query: str, max_results: int = 5):
     Returns:
         List of search results with title, link, and snippet
     """
-    try:
-        from ddgs import DDGS
+    cache_key = (_normalize_query(query), max_results)
+    if (cached := _get_cached_search(cache_key)) is not None:
+        logger.info("💾 Returning cached search results for %r", query)
+        return cached
 
+    try:
         results = []
-        ddgs = DDGS()
 
-        # Use the text search method
-        search_results = ddgs.text(query, max_results=max_results)
+        # DDGS is synchronous; run it in a worker thread so the event loop
+        # (and every other turn) keeps going during the HTTP round-trip
+        search_results = await asyncio.to_thread(_ddgs_text, query, max_results)
 
         for r in search_results:
             results.append({
@@ -85,17 +249,73 @@ async def search_web_duckduckgo(query: str, max_results: int = 5):
                 "snippet": r.get("body", r.get("snippet", ""))
             })
 
-        return results if results else [{"info": "No results found"}]
+        if not results:
+            return [{"info": "No results found"}]
+        _cache_search(cache_key, results)
+        return results
 
-    except ImportError:
-        logger.error("ddgs package not installed")
-        return [{
-            "error": "ddgs not installed. Install with: uv pip install ddgs"
-        }]
     except Exception as e:
-        logger.error(f"Web search error: {str(e)}")
-        import traceback
-        return [{"error": str(e), "traceback": traceback.format_exc()}]
+        # Full traceback goes to the log; the model only needs the error itself
+        logger.exception("Web search error for %r", query)
+        return [{"error": f"{type(e).__name__}: {e}"}]
+
+
+async def _run_web_search_tool_call(
+    tool_call,
+    max_search_results: int,
+    prefetched: dict[str, asyncio.Task] | None = None,
+) -> dict:
+    """Run one web_search tool call and return its tool message."""
+    args = orjson.loads(tool_call.function.arguments)
+    search_query = args.get('query', '')
+
+    if prefetched and (search := prefetched.get(_normalize_query(search_query))):
+        # The speculative search already ran (or is running) for this query
+        logger.info("🔍 Using prefetched search: %r", search_query)
+        search_results = await search
+    else:
+        logger.info("🔍 Searching: %r", search_query)
+
+        # Execute the actual web search!
+        search_results = await search_web_duckduckgo(search_query, max_results=max_search_results)
+
+    logger.info("✅ Found %d results", len(search_results))
+
+    # Format results for the model
+    tool_result = {
+        "query": search_query,
+        "results": search_results
+    }
+    logger.debug("🔍 Tool result: %s", tool_result)
+
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call.id,
+        "content": orjson.dumps(tool_result).decode()
+    }
+
+
+def _timed_out_tool_message(tool_call) -> dict:
+    """Return the tool message for a search that ran past the time budget."""
+    search_query = orjson.loads(tool_call.function.arguments).get('query', '')
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call.id,
+        "content": orjson.dumps({
+            "query": search_query,
+            "results": [{"info": "Search timed out; answer from the other results"}]
+        }).decode()
+    }
+
+
+def _tool_response_content(tool_message: dict) -> ToolResponseContent:
+    """Wrap a web_search tool message for streaming to the client."""
+    return ToolResponseContent(
+        author="agent",
+        tool_call_id=tool_message["tool_call_id"],
+        name="web_search",
+        content=tool_message["content"],
+    )
 
 
 async def run_gemini_with_web_search(
@@ -103,9 +323,9 @@ async def run_gemini_with_web_search(
     max_search_results: int = 5,
     temperature: float = 0.7,
     max_tokens: int = 1000,
-) -> str:
+) -> AsyncGenerator[str | TaskMessageContent, None]:
     """
-    Run Gemini with web search tool via SGP client.
+    Run Gemini with web search tool via SGP client, streaming the answer.
 
     Args:
         messages: List of message dicts with role and content
@@ -113,52 +333,75 @@ async def run_gemini_with_web_search(
         temperature: Model temperature
         max_tokens: Maximum tokens in response
 
-    Returns:
-        The assistant's response text
+    Yields:
+        A tool request per search as it starts and a tool response as each
+        one finishes, then chunks of the assistant's response text
     """
 
-    # Define custom web search tool
-    tool_def = {
-        "type": "function",
-        "function": {
-            "name": "web_search",
-            "description": "Search the web for current, up-to-date information on any topic",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "The search query to look up"
-                    }
-                },
-                "required": ["query"]
-            }
-        }
-    }
+    cache_key = _response_cache_key(messages, temperature, max_tokens)
+    if (cached := _get_cached_response(cache_key)) is not None:
+        logger.info("💾 Returning cached response")
+        yield cached
+        return
+
+    # Most chat turns search for roughly what the user just typed, so start
+    # that search while Gemini decides whether to call the tool at all
+    prefetched: dict[str, asyncio.Task] = {}
+    last_message = messages[-1] if messages else {}
+    user_query = last_message.get("content") if last_message.get("role") == "user" else None
+    if (
+        SPECULATIVE_SEARCH
+        and isinstance(user_query, str)
+        and len(user_query.split()) >= SPECULATIVE_SEARCH_MIN_WORDS
+    ):
+        prefetched[_normalize_query(user_query)] = asyncio.create_task(
+            search_web_duckduckgo(user_query, max_results=max_search_results)
+        )
 
-    tools = [tool_def]
+    try:
+        async for text in _complete_with_web_search(
+            messages, cache_key, prefetched, max_search_results, temperature, max_tokens
+        ):
+            yield text
+    finally:
+        # No-op if the tool call used the speculative search
+        for search in prefetched.values():
+            search.cancel()
 
+
+async def _complete_with_web_search(
+    messages: List[dict],
+    cache_key: str,
+    prefetched: dict[str, asyncio.Task],
+    max_search_results: int,
+    temperature: float,
+    max_tokens: int,
+) -> AsyncGenerator[str | TaskMessageContent, None]:
+    """Ask Gemini, run any web searches it requests, and stream the answer."""
     logger.info("📤 Sending request to Gemini with web search tool")
     
     response = await async_sgp_client.beta.chat.completions.create(
         model=MODEL,
         messages=messages,
-        tools=tools,
+        tools=TOOLS,
         temperature=temperature,
         max_tokens=max_tokens,
     )
 
-    logger.info(f"🤖 Response: {response}")
-
-    message = response.choices[0].message
+    choice = response.choices[0]
+    message = choice.message
+    logger.info(
+        "🤖 Response id=%s finish_reason=%s usage=%s",
+        getattr(response, "id", None),
+        getattr(choice, "finish_reason", None),
+        getattr(response, "usage", None),
+    )
 
     # Check if model wants to use the tool
     if hasattr(message, 'tool_calls') and message.tool_calls:
-        logger.info(f"🔧 Model requested {len(message.tool_calls)} tool call(s)")
+        logger.info("🔧 Model requested %d tool call(s)", len(message.tool_calls))
 
-        # Build conversation with tool responses
-        conversation = messages.copy()
-        conversation.append({
+        assistant_message = {
             "role": "assistant",
             "content": message.content or "",
             "tool_calls": [
@@ -172,54 +415,101 @@ async def run_gemini_with_web_search(
                 }
                 for tc in message.tool_calls
             ]
-        })
-
-        # Execute tool calls
-        for tool_call in message.tool_calls:
-            args = json.loads(tool_call.function.arguments)
-            search_query = args.get('query', '')
-
-            logger.info(f"🔍 Searching: '{search_query}'")
-
-            # Execute the actual web search!
-            search_results = await search_web_duckduckgo(search_query, max_results=max_search_results)
-
-            logger.info(f"✅ Found {len(search_results)} results")
-
-            # Format results for the model
-            tool_result = {
-                "query": search_query,
-                "results": search_results
-            }
-            logger.info(f"🔍 Tool result: {tool_result}")
-
-            conversation.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": json.dumps(tool_result)
-            })
+        }
 
-        logger.info(f"🤖 Conversation: {conversation}")
-        # Get final response with tool results
+        for tc in message.tool_calls:
+            yield ToolRequestContent(
+                author="agent",
+                tool_call_id=tc.id,
+                name=tc.function.name,
+                arguments=orjson.loads(tc.function.arguments),
+            )
+
+        # Execute tool calls concurrently; each search is independent. Report
+        # each one as it finishes rather than waiting for the slowest. Only
+        # time spent waiting on the searches counts against the budget, not
+        # time the consumer takes between yields
+        searches = [
+            asyncio.create_task(
+                _run_web_search_tool_call(tool_call, max_search_results, prefetched)
+            )
+            for tool_call in message.tool_calls
+        ]
+        tool_messages: dict[str, dict] = {}
+        pending = set(searches)
+        budget = SEARCH_TIMEOUT_SECONDS
+        try:
+            while pending and budget > 0:
+                started = time.monotonic()
+                done, pending = await asyncio.wait(
+                    pending, timeout=budget, return_when=asyncio.FIRST_COMPLETED
+                )
+                budget -= time.monotonic() - started
+                if not done:
+                    break
+                for search in done:
+                    tool_message = search.result()
+                    tool_messages[tool_message["tool_call_id"]] = tool_message
+                    yield _tool_response_content(tool_message)
+        finally:
+            for search in searches:
+                search.cancel()
+
+        if pending:
+            logger.warning(
+                "⏱️ %d of %d searches timed out after %.1fs; using partial results",
+                len(pending),
+                len(searches),
+                SEARCH_TIMEOUT_SECONDS,
+            )
+            for tool_call in message.tool_calls:
+                if tool_call.id not in tool_messages:
+                    tool_message = _timed_out_tool_message(tool_call)
+                    tool_messages[tool_call.id] = tool_message
+                    yield _tool_response_content(tool_message)
+
+        # Build conversation with tool responses in one allocation
+        conversation = [
+            *messages,
+            assistant_message,
+            *(tool_messages[tool_call.id] for tool_call in message.tool_calls),
+        ]
+
+        logger.debug("🤖 Conversation len=%d", len(conversation))
+        # Get final response with tool results, forwarding text as it arrives
         logger.info("🤖 Generating final answer with search results...")
 
-        final_response = await async_sgp_client.beta.chat.completions.create(
+        final_stream = await async_sgp_client.beta.chat.completions.create(
             model=MODEL,
             messages=conversation,
-            tools=tools,
+            tools=TOOLS,
             temperature=temperature,
             max_tokens=max_tokens,
+            stream=True,
         )
+        async for chunk in final_stream:
+            if chunk.choices and (text := chunk.choices[0].delta.content):
+                yield text
 
-        logger.info(f"🤖 Final response: {final_response}")
-
-        response_text = final_response.choices[0].message.content
+        logger.info("🤖 Final response streamed")
     else:
         logger.info("💭 Model didn't request tool use")
-        response_text = message.content
+        if message.content:
+            _cache_response(cache_key, message.content)
+            yield message.content
 
-    
-    return response_text
+
+def _iter_message_texts(role: str, content) -> Iterator[str]:
+    """Yield the non-empty text parts of a user or assistant message."""
+    if role == "user" or isinstance(content, str):
+        # User message (or plain assistant message): content is a string
+        if content:
+            yield content
+    elif isinstance(content, list):
+        # Assistant message: content is a list of {'text': ...} parts
+        for content_item in content:
+            if isinstance(content_item, dict) and (text := content_item.get("text")):
+                yield text
 
 
 def parse_messages_to_text_content(input_list: list[dict]) -> list[TextContent]:
@@ -237,50 +527,24 @@ def parse_messages_to_text_content(input_list: list[dict]) -> list[TextContent]:
     Returns:
         List of TextContent objects
     """
-    text_messages = []
-
-    for item in input_list:
-        if not isinstance(item, dict):
-            continue
-
-        role = item.get("role")
-
-        # Skip items without a role (reasoning objects, etc.)
-        if not role:
-            continue
-
-        if role == "user":
-            # User message: content is a string
-            content = item.get("content", "")
-            if content:
-                text_messages.append(TextContent(author="user", content=content))
-
-        elif role == "assistant":
-            # Assistant message: content could be a string or list
-            content = item.get("content", "")
-            if isinstance(content, str):
-                if content:
-                    text_messages.append(TextContent(author="agent", content=content))
-            elif isinstance(content, list):
-                for content_item in content:
-                    if isinstance(content_item, dict):
-                        text = content_item.get("text", "")
-                        if text:
-                            text_messages.append(
-                                TextContent(author="agent", content=text)
-                            )
-
-    return text_messages
+    return [
+        TextContent(author="user" if role == "user" else "agent", content=text)
+        for item in input_list
+        if isinstance(item, dict) and (role := item.get("role")) in ("user", "assistant")
+        for text in _iter_message_texts(role, item.get("content", ""))
+    ]
 
 
 @acp.on_message_send
 async def handle_message_send(
     params: SendMessageParams,
-) -> TaskMessageContent | list[TaskMessageContent] | AsyncGenerator[TaskMessageUpdate, None] | None:
+) -> AsyncGenerator[TaskMessageUpdate, None]:
     """
     Handle incoming messages with web search via custom Gemini implementation.
 
-    This uses the SGP client directly with custom web search tool.
+    This uses the SGP client directly with custom web search tool. The answer
+    is streamed back as text deltas followed by the full message; the sync ACP
+    server persists the streamed message for the task.
     """
 
     # Extract message text
@@ -291,12 +555,14 @@ async def handle_message_send(
             message_text = content_val
 
     if not message_text:
-        return TextContent(
-            author="agent",
-            content="Please provide a message.",
+        yield StreamTaskMessageFull(
+            type="full",
+            index=0,
+            content=TextContent(author="agent", content="Please provide a message."),
         )
+        return
 
-    logger.info(f"📨 Received message: {message_text}")
+    logger.debug("📨 Received message: %s", message_text)
 
     task_state = await adk.state.get_by_task_and_agent(
         task_id=params.task.id, agent_id=params.agent.id
@@ -309,7 +575,9 @@ async def handle_message_send(
             task_id=params.task.id, agent_id=params.agent.id, state=state
         )
     else:
-        state = StateModel.model_validate(task_state.state)
+        # The stored state was validated when it was first written; skip re-validating
+        # the whole (growing) history on every turn
+        state = StateModel.model_construct(**task_state.state)
 
     async with adk.tracing.span(
         trace_id=params.task.id,
@@ -322,44 +590,53 @@ async def handle_message_send(
         # Add the new user message to the message history
         state.input_list.append({"role": "user", "content": message_text})
 
-        # Run Gemini with web search capability
-        response_text = await run_gemini_with_web_search(
+        # Run Gemini with web search capability. Search progress is streamed as
+        # separate tool messages; the answer text always comes after them, so
+        # it takes the next free message index
+        response_parts: list[str] = []
+        text_index = 0
+        async for update in run_gemini_with_web_search(
             messages=state.input_list,
             max_search_results=5,  # Control number of search results here!
             temperature=0.7,
             max_tokens=1000,
-        )
-
-        if response_text is None: 
+        ):
+            if isinstance(update, str):
+                response_parts.append(update)
+                yield StreamTaskMessageDelta(
+                    type="delta",
+                    index=text_index,
+                    delta=TextDelta(type="text", text_delta=update),
+                )
+            else:
+                yield StreamTaskMessageFull(type="full", index=text_index, content=update)
+                text_index += 1
+
+        response_text = "".join(response_parts)
+        if not response_text:
             response_text = "Sorry, I encountered when searching the web. Please try again."
 
-        # Add assistant response to state
+        # Add assistant response to state, dropping the oldest turns past the cap
         state.input_list.append({"role": "assistant", "content": response_text})
+        del state.input_list[:-MAX_HISTORY_MESSAGES]
 
         logger.info("✅ Response generated successfully")
-        # Return the response as TextContent
         span.output = state
 
-        # Send the response to the frontend manually
-
+        # Store the state for the next turn before sending the final message:
+        # the client may close the stream once it has it
         await adk.state.update(
-           state_id=task_state.id,
-           task_id=params.task.id,
-           parent_span_id=span.id if span else None,
-           agent_id=params.agent.id,
-           state=state,
-           trace_id=params.task.id,
-        )
-        logger.info(f"✅ done with turn {state.turn_number}")
-        
-        await adk.messages.create(
+            state_id=task_state.id,
             task_id=params.task.id,
-            content=TextContent(
-                author="agent",
-                content=response_text,
-            ),
             parent_span_id=span.id if span else None,
+            agent_id=params.agent.id,
+            state=state,
+            trace_id=params.task.id,
         )
+        logger.info("✅ done with turn %d", state.turn_number)
 
-    return None
-
+        yield StreamTaskMessageFull(
+            type="full",
+            index=text_index,
+            content=TextContent(author="agent", content=response_text),
+        )
@@ -0,0 +1,22 @@
+"""Process-wide HTTP client shared by the SDK clients in this package."""
+
+import httpx
+from scale_gp import DefaultAioHttpClient
+
+# One long-lived async client (aiohttp transport), so every SDK client built
+# on it shares a single connection pool and reuses open TLS connections. The
+# pool is sized for many concurrent turns, each making two Gemini calls.
+# SSL verification is disabled to match the gateway setup.
+async_http_client = DefaultAioHttpClient(
+    verify=False,
+    limits=httpx.Limits(
+        max_connections=512,
+        max_keepalive_connections=256,
+        keepalive_expiry=60.0,
+    ),
+)
+
+
+async def aclose_http_clients() -> None:
+    """Close the shared HTTP client's connections (call on shutdown)."""
+    await async_http_client.aclose()
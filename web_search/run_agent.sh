@@ -1,2 +1,2 @@
 #!/bin/bash
-uvicorn project.acp:acp --host 0.0.0.0 --port 8000
+uvicorn project.acp:acp --host 0.0.0.0 --port 8000 --loop uvloop